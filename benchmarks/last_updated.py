@@ -0,0 +1,130 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Benchmark for sphinx_astropy.ext.last_updated, comparing the single streamed
+``git log --name-only`` pass with calling ``git log -1`` once per file.
+
+By default, a synthetic repository with a long history is generated with
+``git fast-import``::
+
+    python benchmarks/last_updated.py --files 2000 --commits 50000
+
+Alternatively, an existing repository can be given with ``--repo``, in which
+case the files in ``--path`` (default: ``docs``) that end in ``.rst`` are
+used.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+
+from sphinx_astropy.ext.last_updated import get_last_commit_dates
+
+
+def make_repository(directory, n_files, n_commits, seed=12345):
+    """
+    Create a repository with *n_commits* commits, each changing a few of
+    *n_files* files in ``docs/``, older files being changed less often.
+    """
+
+    rng = random.Random(seed)
+
+    subprocess.check_call(['git', 'init', '-q', directory])
+
+    process = subprocess.Popen(['git', 'fast-import', '--quiet'],
+                               cwd=directory, stdin=subprocess.PIPE)
+
+    def write(data):
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        process.stdin.write(data)
+
+    timestamp = 1000000000
+    for commit in range(n_commits):
+        timestamp += 600
+        write('commit refs/heads/master\n')
+        write('committer Astropy <astropy@example.com> {0} +0000\n'
+              .format(timestamp))
+        message = 'Commit {0}'.format(commit)
+        write('data {0}\n{1}\n'.format(len(message), message))
+        if commit == 0:
+            changed = range(n_files)
+        else:
+            changed = set(int(n_files * rng.random() ** 2)
+                          for i in range(rng.randint(1, 4)))
+        for index in changed:
+            content = 'File {0}, commit {1}\n'.format(index, commit)
+            write('M 644 inline docs/file{0:05d}.rst\n'.format(index))
+            write('data {0}\n{1}'.format(len(content), content))
+        write('\n')
+
+    process.stdin.close()
+    process.wait()
+
+    subprocess.check_call(['git', 'checkout', '-q', 'master'], cwd=directory)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repo', help='existing repository to use')
+    parser.add_argument('--path', default='docs',
+                        help='directory in the repository with the sources')
+    parser.add_argument('--files', type=int, default=2000,
+                        help='number of files in the synthetic repository')
+    parser.add_argument('--commits', type=int, default=50000,
+                        help='number of commits in the synthetic repository')
+    parser.add_argument('--sample', type=int, default=50,
+                        help='number of files to time git log -1 on')
+    args = parser.parse_args()
+
+    if args.repo:
+        toplevel = os.path.abspath(args.repo)
+    else:
+        toplevel = tempfile.mkdtemp()
+        start = time.time()
+        make_repository(toplevel, args.files, args.commits)
+        print('Created repository with {0} files and {1} commits in {2:.1f}s'
+              .format(args.files, args.commits, time.time() - start))
+
+    filenames = []
+    for root, dirs, files in os.walk(os.path.join(toplevel, args.path)):
+        for filename in files:
+            if filename.endswith('.rst'):
+                filenames.append(os.path.relpath(os.path.join(root, filename),
+                                                 toplevel))
+
+    n_commits = subprocess.check_output(['git', 'rev-list', '--count', 'HEAD'],
+                                        cwd=toplevel).decode().strip()
+    print('Looking up {0} files in a history of {1} commits'
+          .format(len(filenames), n_commits))
+
+    start = time.time()
+    dates = get_last_commit_dates(toplevel, filenames, pathspec=args.path)
+    single = time.time() - start
+    print('Single git log pass: {0:.2f}s ({1} dates found)'
+          .format(single, len(dates)))
+
+    sample = random.Random(0).sample(filenames, min(args.sample,
+                                                    len(filenames)))
+    start = time.time()
+    for filename in sample:
+        timestamp = subprocess.check_output(
+            ['git', 'log', '-1', '--format=%ct', '--', filename],
+            cwd=toplevel).decode().strip()
+        assert int(timestamp) == dates[filename]
+    per_file = (time.time() - start) / len(sample) * len(filenames)
+    print('One git log per file: {0:.2f}s (extrapolated from {1} files), '
+          '{2:.0f}x slower'.format(per_file, len(sample), per_file / single))
+
+    if not args.repo:
+        shutil.rmtree(toplevel)
+
+
+if __name__ == '__main__':
+    main()
@@ -170,6 +170,22 @@ graphviz_dot_args = [
     '-Gfontname=Helvetica Neue, Helvetica, Arial, sans-serif'
 ]
 
+# Default configuration for sphinx-gallery. This is only used by packages that
+# add 'sphinx_astropy.ext.gallery' to their extensions, which also runs the
+# examples in parallel with a timeout (see gallery_timeout) and reports the
+# slowest ones. Unlike the sphinx-gallery default, which only executes the
+# examples whose filename starts with 'plot', all examples are executed except
+# those whose filename starts with 'skip_' (the pattern is matched against the
+# full path, so it has to be anchored on the last path separator). The gallery
+# directories should be kept between builds since they hold the cached output
+# of each example.
+sphinx_gallery_conf = {
+    'examples_dirs': path.join('..', 'examples'),
+    'gallery_dirs': path.join('generated', 'examples'),
+    'backreferences_dir': path.join('generated', 'modules'),
+    'filename_pattern': r'(^|[\\/])(?!skip_)[^\\/]*$',
+}
+
 # -- Options for HTML output -------------------------------------------------
 
 # The theme to use for HTML and HTML Help pages.  See the documentation for
@@ -0,0 +1,252 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+"""
+This extension sets up sphinx-gallery with the defaults from the shared
+sphinx-astropy configuration (see ``sphinx_gallery_conf`` in
+``sphinx_astropy.conf.v1``), and adds the following on top of sphinx-gallery:
+
+* Examples are run in parallel using the number of processes given by
+  ``sphinx-build -j``, if the installed sphinx-gallery supports it, joblib is
+  installed, and ``parallel`` is not already set in ``sphinx_gallery_conf``.
+  Otherwise, the reason why the examples are run serially is logged.
+
+* Each example is given a maximum run time, after which it is interrupted and
+  reported as failing. The time taken to scrape the output of the example and
+  to create its thumbnail and downloads also counts towards this time, but
+  only the example code itself is interrupted. This is done by adding a
+  function to ``reset_modules`` that has to be called both before and after
+  each example, so ``reset_modules_order`` is set to ``'both'``, which means
+  that the other functions in ``reset_modules`` are also called after each
+  example. If ``reset_modules_order`` is already set to something else in
+  ``sphinx_gallery_conf``, the timeout is disabled with a warning.
+
+* The slowest examples are listed at the end of the build.
+
+Note that sphinx-gallery already caches the output and thumbnail of each
+example next to an md5 hash of the script in the gallery directory, and only
+re-runs the examples that changed, so the gallery directories should be kept
+between builds.
+
+It has the following configuration options (to be set in the project's
+``conf.py``):
+
+* ``gallery_timeout``
+    The maximum time in seconds that each example is allowed to run for. Set
+    this to `None` to disable the timeout. Defaults to 600. This is not
+    supported on platforms without ``SIGALRM`` (e.g. Windows).
+
+* ``gallery_report_slowest``
+    The number of slowest examples to list at the end of the build. Defaults
+    to 10.
+"""
+
+from __future__ import print_function
+
+import os
+import re
+import signal
+from distutils.version import LooseVersion
+
+from sphinx import __version__
+
+SPHINX_LT_30 = LooseVersion(__version__) < LooseVersion('3.0')
+
+TIME_PATTERN = re.compile(r'\*\*Total running time of the script:\*\*\s*'
+                          r'\(\s*(\d+) minutes\s+([0-9.]+) seconds\)')
+
+
+class ExampleTimeoutError(RuntimeError):
+    pass
+
+
+class ExampleTimeout(object):
+    """
+    A sphinx-gallery ``reset_modules`` callable which sets an alarm before
+    each example is run and clears it once the example has finished.
+
+    sphinx-gallery only calls the ``'after'`` hook once the output of the
+    example has been scraped and its thumbnail and downloads created, so the
+    alarm can go off outside of the example code. In that case it is checked
+    again shortly afterwards, so that the error is only ever raised in the
+    example code, and it is cleared (and the previous handler restored) if
+    sphinx-gallery is no longer running, e.g. because it aborted the build.
+    """
+
+    # How often to check again whether the example code is running
+    recheck_interval = 0.1
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._previous_handler = None
+
+    def _clear(self):
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        if self._previous_handler is not None:
+            signal.signal(signal.SIGALRM, self._previous_handler)
+            self._previous_handler = None
+
+    def __call__(self, gallery_conf, fname, when):
+
+        if when == 'before':
+
+            basename = os.path.basename(fname)
+
+            def handler(signum, frame):
+                in_example = in_gallery = False
+                while frame is not None:
+                    filename = frame.f_code.co_filename
+                    if os.path.basename(filename) == basename:
+                        in_example = True
+                        break
+                    if (frame.f_globals.get('__name__') or '').startswith(
+                            'sphinx_gallery'):
+                        in_gallery = True
+                    frame = frame.f_back
+                if in_example:
+                    self._clear()
+                    raise ExampleTimeoutError(
+                        "Example {0} did not complete within {1} "
+                        "seconds".format(fname, self.timeout))
+                elif in_gallery:
+                    signal.setitimer(signal.ITIMER_REAL,
+                                     self.recheck_interval)
+                else:
+                    self._clear()
+
+            self._clear()
+            self._previous_handler = signal.signal(signal.SIGALRM, handler)
+            signal.setitimer(signal.ITIMER_REAL, self.timeout)
+
+        else:
+
+            self._clear()
+
+    def __eq__(self, other):
+        return (isinstance(other, ExampleTimeout) and
+                other.timeout == self.timeout)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.timeout)
+
+    # Sphinx uses the representation of the configuration to determine
+    # whether the output is outdated, so this needs to be stable.
+    def __repr__(self):
+        return 'ExampleTimeout({0!r})'.format(self.timeout)
+
+
+def configure_gallery(app, config=None):
+
+    from sphinx.util import logging
+    logger = logging.getLogger(__name__)
+
+    from sphinx_gallery.gen_gallery import DEFAULT_GALLERY_CONF
+
+    gallery_conf = dict(app.config.sphinx_gallery_conf)
+
+    if 'parallel' not in gallery_conf:
+        if 'parallel' not in DEFAULT_GALLERY_CONF:
+            reason = 'the installed version of sphinx-gallery does not ' \
+                     'support it'
+        elif app.parallel <= 1:
+            reason = 'sphinx-build was not run with -j'
+        else:
+            try:
+                import joblib  # noqa
+            except ImportError:
+                reason = 'joblib is not installed'
+            else:
+                reason = None
+                gallery_conf['parallel'] = app.parallel
+        if reason is not None:
+            logger.info('[gallery] examples will be run serially since '
+                        '{0}'.format(reason))
+
+    timeout = app.config.gallery_timeout
+
+    if timeout:
+        if 'reset_modules_order' not in DEFAULT_GALLERY_CONF:
+            logger.warning('[gallery] the installed version of sphinx-gallery '
+                           'does not support gallery_timeout')
+        elif not hasattr(signal, 'SIGALRM'):
+            logger.warning('[gallery] gallery_timeout is not supported on '
+                           'this platform')
+        elif gallery_conf.get('reset_modules_order', 'both') != 'both':
+            logger.warning("[gallery] gallery_timeout requires "
+                           "reset_modules_order to be 'both' in "
+                           "sphinx_gallery_conf, the timeout is disabled")
+        else:
+            reset_modules = gallery_conf.get(
+                'reset_modules', DEFAULT_GALLERY_CONF['reset_modules'])
+            if not isinstance(reset_modules, (tuple, list)):
+                reset_modules = (reset_modules,)
+            reset_modules = tuple(reset for reset in reset_modules
+                                  if not isinstance(reset, ExampleTimeout))
+            gallery_conf['reset_modules'] = (reset_modules +
+                                             (ExampleTimeout(timeout),))
+            gallery_conf['reset_modules_order'] = 'both'
+
+    app.config.sphinx_gallery_conf = gallery_conf
+
+
+def find_running_times(directory):
+    for root, dirs, files in os.walk(directory):
+        for filename in files:
+            if not filename.endswith('.rst'):
+                continue
+            path = os.path.join(root, filename)
+            with open(path) as f:
+                match = TIME_PATTERN.search(f.read())
+            if match is not None:
+                minutes, seconds = match.groups()
+                yield path, int(minutes) * 60 + float(seconds)
+
+
+def report_slowest(app, exception):
+
+    if exception is not None or not app.config.gallery_report_slowest:
+        return
+
+    from sphinx.util import logging
+    info = logging.getLogger(__name__).info
+
+    gallery_dirs = app.config.sphinx_gallery_conf.get('gallery_dirs', [])
+    if not isinstance(gallery_dirs, (tuple, list)):
+        gallery_dirs = [gallery_dirs]
+
+    times = []
+    for directory in gallery_dirs:
+        times.extend(find_running_times(os.path.join(app.srcdir, directory)))
+
+    if not times:
+        return
+
+    times.sort(key=lambda item: item[1], reverse=True)
+
+    info('[gallery] Slowest examples:')
+    for path, seconds in times[:app.config.gallery_report_slowest]:
+        info('[gallery]   {0:8.2f}s  {1}'.format(
+            seconds, os.path.relpath(path, app.srcdir)))
+
+
+def setup(app):
+
+    app.setup_extension('sphinx_gallery.gen_gallery')
+
+    app.add_config_value('gallery_timeout', 600, True)
+    app.add_config_value('gallery_report_slowest', 10, True)
+
+    # sphinx-gallery fills in its defaults during config-inited with priority
+    # 10 (or during builder-inited in older versions), so we need to make sure
+    # we update the configuration before that.
+    if SPHINX_LT_30:
+        app.connect('config-inited', configure_gallery)
+    else:
+        app.connect('config-inited', configure_gallery, priority=5)
+
+    app.connect('build-finished', report_slowest)
+
+    return {'parallel_read_safe': True,
+            'parallel_write_safe': True}
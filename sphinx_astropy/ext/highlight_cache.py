@@ -0,0 +1,199 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+"""
+This extension caches the output of Pygments for code blocks between builds.
+
+Highlighting code blocks (including the examples in docstrings and the blocks
+produced by the directives in ``sphinx_astropy.ext.doctest``) can take a
+significant fraction of the time spent writing the output. With this
+extension, the highlighted HTML and LaTeX for each code block is stored on
+disk, keyed by the code, language, highlighting options and Pygments style,
+and is reused in later builds. The cache is stored as one file per entry so
+that it can be safely shared by the processes of a parallel build, and the
+hit rate is reported at the end of the build.
+
+Code blocks for which highlighting emitted a warning are not cached, so that
+the warning is emitted again in the next build.
+
+It has the following configuration option (to be set in the project's
+``conf.py``):
+
+* ``highlight_cache_dir``
+    The directory in which to store the cache. Defaults to ``highlight_cache``
+    in the doctree directory.
+"""
+
+from __future__ import print_function
+
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+
+import pygments
+from sphinx import __version__
+from sphinx.highlighting import PygmentsBridge
+
+# The cache for the current build, if any
+_active_cache = None
+
+_original_highlight_block = PygmentsBridge.highlight_block
+
+
+class WarningRecorder(logging.Handler):
+    """
+    Keep track of whether any warnings were emitted while highlighting.
+    """
+
+    def __init__(self):
+        super(WarningRecorder, self).__init__(level=logging.WARNING)
+        self.warned = False
+
+    def emit(self, record):
+        self.warned = True
+
+
+class HighlightCache(object):
+
+    def __init__(self, directory, stylename):
+        self.directory = directory
+        self.stylename = stylename
+        self.memory = {}
+        # These are shared with the processes forked for parallel writes
+        self.hits = multiprocessing.Value('i', 0)
+        self.misses = multiprocessing.Value('i', 0)
+
+    def make_key(self, bridge, source, lang, opts, force, kwargs):
+        if isinstance(source, bytes):
+            source = source.decode()
+        key = [__version__, pygments.__version__, self.stylename,
+               bridge.dest, getattr(bridge, 'latex_engine', None),
+               sorted(bridge.formatter_args.items()),
+               source, lang, opts, force, kwargs]
+        key = json.dumps(key, sort_keys=True, default=repr)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def filename(self, key):
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def get(self, key):
+        if key in self.memory:
+            return self.memory[key]
+        try:
+            with io.open(self.filename(key), encoding='utf-8') as f:
+                value = f.read()
+        except (IOError, OSError):
+            return None
+        self.memory[key] = value
+        return value
+
+    def set(self, key, value):
+        self.memory[key] = value
+        filename = self.filename(key)
+        directory = os.path.dirname(filename)
+        if not os.path.exists(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:  # created by another process in the meantime
+                pass
+        # Write to a temporary file first so that other processes never see
+        # a partially written entry.
+        tmp_filename = '{0}.{1}.tmp'.format(filename, os.getpid())
+        with io.open(tmp_filename, 'w', encoding='utf-8') as f:
+            f.write(value)
+        if hasattr(os, 'replace'):
+            os.replace(tmp_filename, filename)
+        else:
+            # On Python 2, renaming over an existing file fails on Windows, in
+            # which case another process already wrote the same entry.
+            try:
+                os.rename(tmp_filename, filename)
+            except OSError:
+                os.remove(tmp_filename)
+
+    def count(self, hit):
+        counter = self.hits if hit else self.misses
+        with counter.get_lock():
+            counter.value += 1
+
+
+def highlight_block(self, source, lang, opts=None, force=False,
+                    location=None, **kwargs):
+
+    cache = _active_cache
+
+    if cache is None:
+        return _original_highlight_block(self, source, lang, opts=opts,
+                                         force=force, location=location,
+                                         **kwargs)
+
+    key = cache.make_key(self, source, lang, opts, force, kwargs)
+
+    highlighted = cache.get(key)
+    if highlighted is not None:
+        cache.count(hit=True)
+        return highlighted
+
+    cache.count(hit=False)
+
+    recorder = WarningRecorder()
+    logger = logging.getLogger('sphinx.sphinx.highlighting')
+    logger.addHandler(recorder)
+    try:
+        highlighted = _original_highlight_block(self, source, lang, opts=opts,
+                                                force=force, location=location,
+                                                **kwargs)
+    finally:
+        logger.removeHandler(recorder)
+
+    if not recorder.warned:
+        cache.set(key, highlighted)
+
+    return highlighted
+
+
+def activate_cache(app):
+
+    global _active_cache
+
+    directory = app.config.highlight_cache_dir
+    if directory is None:
+        directory = os.path.join(app.doctreedir, 'highlight_cache')
+    else:
+        directory = os.path.join(app.confdir, directory)
+
+    _active_cache = HighlightCache(directory, app.config.pygments_style)
+
+
+def report_hit_rate(app, exception):
+
+    global _active_cache
+
+    cache, _active_cache = _active_cache, None
+
+    if exception is not None or cache is None:
+        return
+
+    from sphinx.util.logging import getLogger
+    info = getLogger(__name__).info
+
+    hits, misses = cache.hits.value, cache.misses.value
+
+    if hits + misses > 0:
+        info('[highlight_cache] {0} hits, {1} misses ({2:.1f}% hit rate)'
+             .format(hits, misses, 100. * hits / (hits + misses)))
+
+
+def setup(app):
+
+    PygmentsBridge.highlight_block = highlight_block
+
+    app.add_config_value('highlight_cache_dir', None, True)
+
+    app.connect('builder-inited', activate_cache)
+    app.connect('build-finished', report_hit_rate)
+
+    return {'parallel_read_safe': True,
+            'parallel_write_safe': True}
@@ -0,0 +1,157 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+"""
+This extension sets the "last updated" date of each page (used when
+``html_last_updated_fmt`` is set) to the date of the last git commit that
+changed the source of the page, rather than the date of the build.
+
+The dates for all the source files are obtained from a single
+``git log --name-only`` call, whose output is processed as it is streamed and
+stopped as soon as all documents have been found. The result is cached in
+the doctree directory and only recomputed when ``HEAD`` changes. Pages whose
+source is not committed yet keep the build date.
+
+It has the following configuration option (to be set in the project's
+``conf.py``):
+
+* ``last_updated_git``
+    Whether to use the git history to determine the dates. Defaults to
+    `True`.
+"""
+
+from __future__ import print_function
+
+import json
+import os
+import subprocess
+from datetime import datetime
+
+CACHE_FILENAME = 'last_updated.json'
+
+
+def run_git(args, cwd):
+    return subprocess.check_output(['git'] + args, cwd=cwd,
+                                   stderr=subprocess.STDOUT).decode().strip()
+
+
+def iter_git_log(cwd, paths):
+    """
+    Yield ``(timestamp, filename)`` for every file changed by every commit
+    touching *paths*, from the most recent commit to the oldest, with
+    filenames relative to the root of the repository.
+    """
+    process = subprocess.Popen(['git', '-c', 'core.quotepath=off', 'log',
+                                '--name-only', '--no-renames',
+                                '--format=format:%x00%ct', '--'] + paths,
+                               cwd=cwd, stdout=subprocess.PIPE)
+    try:
+        timestamp = None
+        for line in process.stdout:
+            line = line.decode('utf-8').rstrip('\n')
+            if line.startswith('\x00'):
+                timestamp = int(line[1:])
+            elif line:
+                yield timestamp, line
+    finally:
+        process.stdout.close()
+        process.kill()
+        process.wait()
+
+
+def get_last_commit_dates(toplevel, filenames, pathspec='.'):
+    """
+    Return a dictionary giving the time (as a UNIX timestamp) of the last
+    commit changing each of *filenames*, which should be relative to
+    *toplevel*. Files which are not in the history are not included. The
+    history can be restricted to the files matching *pathspec*.
+    """
+    remaining = set(filenames)
+    dates = {}
+    if not remaining:
+        return dates
+    for timestamp, filename in iter_git_log(toplevel, [pathspec]):
+        if filename in remaining:
+            dates[filename] = timestamp
+            remaining.remove(filename)
+            # Stop reading the history as soon as all files have been found
+            if not remaining:
+                break
+    return dates
+
+
+def load_dates(app, env):
+
+    app.last_updated_dates = {}
+
+    if not app.config.last_updated_git or app.builder.format != 'html':
+        return
+
+    from sphinx.util import logging
+    logger = logging.getLogger(__name__)
+
+    try:
+        toplevel = run_git(['rev-parse', '--show-toplevel'], app.srcdir)
+        head = run_git(['rev-parse', 'HEAD'], app.srcdir)
+    except (OSError, subprocess.CalledProcessError):
+        logger.info('[last_updated] not a git repository, using the build '
+                    'date for all pages')
+        return
+
+    toplevel = os.path.realpath(toplevel)
+
+    cache_filename = os.path.join(app.doctreedir, CACHE_FILENAME)
+    if os.path.exists(cache_filename):
+        with open(cache_filename) as f:
+            try:
+                cache = json.load(f)
+            except ValueError:
+                cache = {}
+    else:
+        cache = {}
+
+    filenames = {}
+    for docname in env.found_docs:
+        path = os.path.realpath(env.doc2path(docname))
+        filenames[docname] = os.path.relpath(path, toplevel).replace(os.sep,
+                                                                     '/')
+
+    if cache.get('head') == head and set(cache['dates']) >= set(filenames):
+        dates = cache['dates']
+    else:
+        srcdir = os.path.relpath(os.path.realpath(app.srcdir), toplevel)
+        dates = get_last_commit_dates(toplevel, filenames.values(),
+                                      pathspec=srcdir)
+        dates = dict((docname, dates.get(filename))
+                     for docname, filename in filenames.items())
+        with open(cache_filename, 'w') as f:
+            json.dump({'head': head, 'dates': dates}, f)
+
+    app.last_updated_dates = dates
+
+
+def html_page_context(app, pagename, templatename, context, doctree):
+
+    fmt = app.config.html_last_updated_fmt
+    timestamp = getattr(app, 'last_updated_dates', {}).get(pagename)
+
+    if fmt is None or timestamp is None:
+        return
+
+    from sphinx.util.i18n import format_date
+
+    context['last_updated'] = format_date(
+        fmt or '%b %d, %Y', date=datetime.fromtimestamp(timestamp),
+        language=app.config.language)
+
+
+def setup(app):
+
+    app.add_config_value('last_updated_git', True, True)
+
+    # We need to wait until all documents have been found, but the dates have
+    # to be loaded before any parallel write processes are started.
+    app.connect('env-updated', load_dates)
+    app.connect('html-page-context', html_page_context)
+
+    return {'parallel_read_safe': True,
+            'parallel_write_safe': True}
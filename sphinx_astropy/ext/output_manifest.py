@@ -0,0 +1,188 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+"""
+This extension makes it possible to deploy only the output files that changed
+since the previous build.
+
+Sphinx rewrites most output files on every build, even when their content is
+identical, which changes their modification times and means that tools such as
+rsync have to transfer the whole site. At the end of the build, this extension
+compares the content hash of each output file with the one from the previous
+build, and restores the previous modification time of files whose content did
+not change. This is not done for pages that would then look older than their
+source or the templates, since Sphinx would otherwise consider them outdated
+in every following build. It then writes a JSON manifest listing the paths
+(relative to the output directory) that were ``changed``, ``added`` and
+``removed``.
+
+It has the following configuration option (to be set in the project's
+``conf.py``):
+
+* ``output_manifest_file``
+    The path of the manifest file, relative to the output directory. Defaults
+    to ``output_manifest.json`` in the doctree directory, so that the manifest
+    itself is not deployed.
+"""
+
+from __future__ import print_function
+
+import hashlib
+import json
+import os
+from distutils.version import LooseVersion
+
+from sphinx import __version__
+
+SPHINX_LT_30 = LooseVersion(__version__) < LooseVersion('3.0')
+
+STATE_FILENAME = 'output_manifest_state.json'
+
+
+def file_digest(path):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def find_files(outdir, exclude):
+    for root, dirs, files in os.walk(outdir):
+        dirs[:] = [d for d in dirs
+                   if os.path.abspath(os.path.join(root, d)) not in exclude]
+        for filename in files:
+            path = os.path.join(root, filename)
+            if os.path.abspath(path) not in exclude:
+                yield path
+
+
+def get_mtime_ns(stat):
+    # Nanosecond timestamps are only available on Python 3
+    if hasattr(stat, 'st_mtime_ns'):
+        return stat.st_mtime_ns
+    return int(round(stat.st_mtime * 1e9))
+
+
+def set_mtime_ns(path, stat, mtime):
+    if hasattr(stat, 'st_atime_ns'):
+        os.utime(path, ns=(stat.st_atime_ns, mtime))
+    else:
+        os.utime(path, (stat.st_atime, mtime / 1e9))
+
+
+def load_state(filename):
+    if os.path.exists(filename):
+        with open(filename) as f:
+            try:
+                return json.load(f)
+            except ValueError:
+                pass
+    return {}
+
+
+def page_mtimes(app):
+    """
+    Return a dictionary giving, for the absolute path of each page written by
+    the builder, the modification time in nanoseconds below which Sphinx
+    considers the page outdated.
+    """
+    builder = app.builder
+    if not hasattr(builder, 'get_outfilename'):
+        return {}
+    try:
+        template_mtime = int(builder.templates.newest_template_mtime() * 1e9)
+    except AttributeError:
+        template_mtime = 0
+    mtimes = {}
+    for docname in app.env.found_docs:
+        try:
+            source_mtime = get_mtime_ns(os.stat(app.env.doc2path(docname)))
+        except OSError:
+            continue
+        path = os.path.abspath(builder.get_outfilename(docname))
+        mtimes[path] = max(source_mtime, template_mtime)
+    return mtimes
+
+
+def write_manifest(app, exception):
+
+    if exception is not None:
+        return
+
+    from sphinx.util import logging
+    info = logging.getLogger(__name__).info
+
+    if app.config.output_manifest_file:
+        manifest_filename = os.path.join(app.outdir,
+                                         app.config.output_manifest_file)
+    else:
+        manifest_filename = os.path.join(app.doctreedir,
+                                         'output_manifest.json')
+
+    state_filename = os.path.join(app.doctreedir, STATE_FILENAME)
+    state = load_state(state_filename)
+
+    exclude = set(os.path.abspath(path) for path in
+                  (app.doctreedir, manifest_filename))
+
+    min_mtimes = page_mtimes(app)
+
+    new_state = {}
+    changed = []
+    added = []
+
+    for path in find_files(app.outdir, exclude):
+
+        relpath = os.path.relpath(path, app.outdir).replace(os.sep, '/')
+        stat = os.stat(path)
+        mtime = get_mtime_ns(stat)
+
+        previous = state.get(relpath)
+
+        if (previous is not None and previous[1] == stat.st_size and
+                previous[2] == mtime):
+            # The file was not written to during this build
+            digest = previous[0]
+        else:
+            digest = file_digest(path)
+            if previous is None:
+                added.append(relpath)
+            elif previous[0] == digest:
+                if previous[2] >= min_mtimes.get(os.path.abspath(path), 0):
+                    mtime = previous[2]
+                    set_mtime_ns(path, stat, mtime)
+            else:
+                changed.append(relpath)
+
+        new_state[relpath] = [digest, stat.st_size, mtime]
+
+    removed = set(state) - set(new_state)
+
+    manifest = {'changed': sorted(changed),
+                'added': sorted(added),
+                'removed': sorted(removed)}
+
+    with open(manifest_filename, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    with open(state_filename, 'w') as f:
+        json.dump(new_state, f)
+
+    info('[output_manifest] {0} changed, {1} added, {2} removed, {3} unchanged '
+         'output files'.format(len(changed), len(added), len(removed),
+                               len(new_state) - len(changed) - len(added)))
+
+
+def setup(app):
+
+    app.add_config_value('output_manifest_file', None, True)
+
+    # We want this to run after any other extension that writes output files
+    # at the end of the build (such as sphinx_astropy.ext.precompress).
+    if SPHINX_LT_30:
+        app.connect('build-finished', write_manifest)
+    else:
+        app.connect('build-finished', write_manifest, priority=900)
+
+    return {'parallel_read_safe': True,
+            'parallel_write_safe': True}
@@ -0,0 +1,194 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+"""
+This extension writes precompressed siblings (``.gz`` and optionally ``.br``)
+of the HTML output at the end of the build, so that static hosting which
+supports serving precompressed files doesn't have to compress on the fly.
+
+Files are compressed in a process pool, and a file is only recompressed if its
+content changed since the last build (the content hashes are stored in the
+doctree directory). It has the following configuration options (to be set in
+the project's ``conf.py``):
+
+* ``precompress_suffixes``
+    The file extensions that should be compressed. Defaults to ``.html``,
+    ``.js``, ``.css`` and ``.svg``, which also covers the search index.
+
+* ``precompress_brotli``
+    Whether to also write ``.br`` files. This requires the ``brotli`` package.
+    Defaults to `False`.
+
+* ``precompress_workers``
+    The number of worker processes to use. Defaults to the number of CPUs.
+"""
+
+from __future__ import print_function
+
+import gzip
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+
+HTML_BUILDERS = ('html', 'dirhtml', 'singlehtml')
+
+STATE_FILENAME = 'precompress.json'
+
+
+def gzip_compress(data):
+    # We set mtime to 0 so that identical input gives identical output
+    buffer = io.BytesIO()
+    with gzip.GzipFile(filename='', mode='wb', compresslevel=9,
+                       fileobj=buffer, mtime=0) as f:
+        f.write(data)
+    return buffer.getvalue()
+
+
+def brotli_compress(data):
+    import brotli
+    return brotli.compress(data, quality=11)
+
+
+COMPRESSORS = {'.gz': gzip_compress,
+               '.br': brotli_compress}
+
+
+def compress_file(path, old_digest, extensions):
+    """
+    Write the compressed siblings of *path* if its content does not match
+    *old_digest* or if any sibling is missing, and remove the siblings for
+    compression formats that are not enabled. Returns the path, the new
+    digest, whether the file was recompressed, the original size and a
+    dictionary giving the size of each compressed sibling.
+    """
+
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    digest = hashlib.sha1(data).hexdigest()
+
+    changed = (digest != old_digest or
+               not all(os.path.exists(path + ext) for ext in extensions))
+
+    # Siblings left over from a build with other settings would otherwise
+    # never be updated again, so hosts could serve outdated pages.
+    for ext in COMPRESSORS:
+        if ext not in extensions and os.path.exists(path + ext):
+            os.remove(path + ext)
+
+    sizes = {}
+    for ext in extensions:
+        if changed:
+            compressed = COMPRESSORS[ext](data)
+            with open(path + ext, 'wb') as f:
+                f.write(compressed)
+            sizes[ext] = len(compressed)
+        else:
+            sizes[ext] = os.path.getsize(path + ext)
+
+    return path, digest, changed, len(data), sizes
+
+
+def compress_file_args(args):
+    return compress_file(*args)
+
+
+def find_files(outdir, suffixes):
+    for root, dirs, files in os.walk(outdir):
+        for filename in files:
+            if filename.endswith(tuple(suffixes)):
+                yield os.path.join(root, filename)
+
+
+def load_state(filename):
+    if os.path.exists(filename):
+        with open(filename) as f:
+            try:
+                return json.load(f)
+            except ValueError:
+                pass
+    return {}
+
+
+def precompress_output(app, exception):
+
+    if exception is not None or app.builder.name not in HTML_BUILDERS:
+        return
+
+    from sphinx.util import logging
+    logger = logging.getLogger(__name__)
+
+    extensions = ['.gz']
+    if app.config.precompress_brotli:
+        try:
+            import brotli  # noqa
+        except ImportError:
+            logger.warning('[precompress] precompress_brotli is set but the '
+                           'brotli package is not installed, only writing '
+                           '.gz files')
+        else:
+            extensions.append('.br')
+
+    state_filename = os.path.join(app.doctreedir, STATE_FILENAME)
+    state = load_state(state_filename)
+
+    paths = sorted(find_files(app.outdir, app.config.precompress_suffixes))
+    relpaths = [os.path.relpath(path, app.outdir) for path in paths]
+    args = [(path, state.get(relpath), extensions)
+            for path, relpath in zip(paths, relpaths)]
+
+    workers = app.config.precompress_workers or multiprocessing.cpu_count()
+
+    if workers > 1 and len(args) > 1:
+        pool = multiprocessing.Pool(workers)
+        try:
+            results = pool.map(compress_file_args, args, chunksize=16)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [compress_file(*arg) for arg in args]
+
+    new_state = {}
+    n_changed = 0
+    original_size = 0
+    compressed_size = dict((ext, 0) for ext in extensions)
+
+    for relpath, result in zip(relpaths, results):
+        path, digest, changed, size, sizes = result
+        new_state[relpath] = digest
+        n_changed += changed
+        original_size += size
+        for ext in extensions:
+            compressed_size[ext] += sizes[ext]
+
+    # Remove compressed files left over from output files that no longer exist
+    for relpath in set(state) - set(new_state):
+        for ext in COMPRESSORS:
+            path = os.path.join(app.outdir, relpath + ext)
+            if os.path.exists(path):
+                os.remove(path)
+
+    with open(state_filename, 'w') as f:
+        json.dump(new_state, f)
+
+    logger.info('[precompress] compressed {0} of {1} files'.format(n_changed,
+                                                                  len(paths)))
+    for ext in extensions:
+        logger.info('[precompress] {0}: {1} bytes saved ({2} -> {3} bytes)'
+                    .format(ext, original_size - compressed_size[ext],
+                            original_size, compressed_size[ext]))
+
+
+def setup(app):
+
+    app.add_config_value('precompress_suffixes',
+                         ['.html', '.js', '.css', '.svg'], True)
+    app.add_config_value('precompress_brotli', False, True)
+    app.add_config_value('precompress_workers', None, True)
+
+    app.connect('build-finished', precompress_output)
+
+    return {'parallel_read_safe': True,
+            'parallel_write_safe': True}
@@ -0,0 +1,157 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+"""
+This extension reorders the documents to read in parallel builds so that the
+time spent reading is spread evenly over the worker processes.
+
+Sphinx splits the sorted list of documents into consecutive chunks for the
+parallel read, so that expensive documents that sort close to each other (for
+example the API pages generated by automodapi) tend to end up in the same
+chunk, leaving one process working long after the others have finished. This
+extension records how long each document took to read, and in the following
+builds uses these times to reorder the documents so that each chunk has a
+similar cost, with the most expensive chunks dispatched first.
+
+After the documents have been read, the achieved load balance is reported as
+the ratio of the maximum to the mean read time over the worker processes
+(1 is a perfect balance).
+"""
+
+from __future__ import print_function
+
+import heapq
+import time
+
+from sphinx.util.parallel import make_chunks, parallel_available
+
+
+def record_start(app, docname, source):
+    app.env.temp_data['read_balance_start'] = time.time()
+
+
+def record_end(app, doctree):
+    start = app.env.temp_data.get('read_balance_start')
+    if start is None:
+        return
+    if not hasattr(app.env, 'read_balance_times'):
+        app.env.read_balance_times = {}
+    app.env.read_balance_times[app.env.docname] = time.time() - start
+
+
+def merge_times(app, env, docnames, other):
+    # Note that we deliberately don't remove times when documents are purged
+    # since we need the times from the previous build to order the documents
+    # that are about to be read again.
+    if not hasattr(env, 'read_balance_times'):
+        env.read_balance_times = {}
+    other_times = getattr(other, 'read_balance_times', {})
+    for docname in docnames:
+        if docname in other_times:
+            env.read_balance_times[docname] = other_times[docname]
+
+
+def balance_docnames(docnames, costs, nproc):
+    """
+    Reorder *docnames* so that the chunks created by Sphinx for *nproc*
+    processes have similar total *costs* (a dictionary giving the cost of each
+    document), with the most expensive chunks first.
+    """
+
+    sizes = [len(chunk) for chunk in make_chunks(docnames, nproc)]
+
+    chunks = [[] for size in sizes]
+    loads = [0.] * len(sizes)
+
+    # Assign the most expensive documents first, each to the chunk with the
+    # lowest total cost that isn't full yet.
+    for docname in sorted(docnames, key=lambda docname: -costs[docname]):
+        index = min((i for i in range(len(sizes)) if len(chunks[i]) < sizes[i]),
+                    key=lambda i: loads[i])
+        chunks[index].append(docname)
+        loads[index] += costs[docname]
+
+    # Only the last chunk can be smaller than the others, so it has to stay
+    # last for the chunk boundaries to be unchanged.
+    order = sorted(range(len(sizes) - 1), key=lambda i: -loads[i])
+    order.append(len(sizes) - 1)
+
+    return [docname for index in order for docname in chunks[index]]
+
+
+def worker_times(chunk_costs, nproc):
+    """
+    Given the costs of the chunks in the order in which they are dispatched,
+    return the total time spent by each worker process, assuming that each
+    chunk is picked up by the first process to become available.
+    """
+    workers = [0.] * min(nproc, len(chunk_costs))
+    heapq.heapify(workers)
+    for cost in chunk_costs:
+        heapq.heappush(workers, heapq.heappop(workers) + cost)
+    return workers
+
+
+def parallel_read_allowed(app):
+    """
+    Return whether Sphinx will read the documents in parallel, following the
+    same checks as ``Sphinx.is_parallel_allowed`` but without emitting
+    warnings (Sphinx emits them itself when it falls back to a serial read).
+    """
+    if not parallel_available or app.parallel <= 1:
+        return False
+    return all(getattr(extension, 'parallel_read_safe', None)
+               for extension in app.extensions.values())
+
+
+def reorder_docnames(app, env, docnames):
+
+    # Sphinx only reads in parallel above five documents
+    if len(docnames) <= 5 or not parallel_read_allowed(app):
+        return
+
+    times = getattr(env, 'read_balance_times', {})
+    known = [times[docname] for docname in docnames if docname in times]
+
+    if known:
+        # Documents that were never read are given the mean cost
+        default = sum(known) / len(known)
+        costs = dict((docname, times.get(docname, default))
+                     for docname in docnames)
+        docnames[:] = balance_docnames(docnames, costs, app.parallel)
+
+    app.read_balance_docnames = list(docnames)
+
+
+def report_balance(app, env):
+
+    docnames = getattr(app, 'read_balance_docnames', None)
+    if not docnames:
+        return
+    app.read_balance_docnames = None
+
+    from sphinx.util import logging
+    info = logging.getLogger(__name__).info
+
+    times = getattr(env, 'read_balance_times', {})
+    chunks = make_chunks(docnames, app.parallel)
+    workers = worker_times([sum(times.get(docname, 0.) for docname in chunk)
+                            for chunk in chunks], app.parallel)
+
+    mean = sum(workers) / len(workers)
+    if mean > 0:
+        info('[read_balance] read {0} documents in {1} chunks on {2} '
+             'processes, max/mean process time: {3:.2f} ({4:.2f}s/{5:.2f}s)'
+             .format(len(docnames), len(chunks), len(workers),
+                     max(workers) / mean, max(workers), mean))
+
+
+def setup(app):
+
+    app.connect('source-read', record_start)
+    app.connect('doctree-read', record_end)
+    app.connect('env-merge-info', merge_times)
+    app.connect('env-before-read-docs', reorder_docnames)
+    app.connect('env-updated', report_balance)
+
+    return {'parallel_read_safe': True,
+            'parallel_write_safe': True}
@@ -0,0 +1,170 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+"""
+This extension keeps track of which Python source files each document depends
+on, so that editing the documented package only rebuilds the affected pages.
+
+While documents are read, it records the source files of the modules and
+objects that are pulled in by autodoc (including the pages generated by
+automodapi), the ``automodapi`` and ``automodsumm`` directives, and the Python
+objects documented on each page (for which ``edit_on_github`` and viewcode
+add links to the source), along with a hash of the content of each file. At
+the start of the next build, any document that depends on a file whose
+content changed is read again, and the file that triggered the rebuild is
+logged.
+
+Since changes are detected by content rather than by modification time,
+switching git branches back and forth or touching files without changing them
+does not by itself cause pages to be rebuilt by this extension.
+"""
+
+from __future__ import print_function
+
+import hashlib
+import inspect
+import os
+import re
+import sys
+
+from sphinx import addnodes
+
+from .edit_on_github import import_object
+
+AUTOMOD_PATTERN = re.compile(r'^\s*\.\.\s+automod(?:api|summ)::\s*([\w.]+)',
+                             flags=re.MULTILINE)
+
+
+def file_digest(filename):
+    try:
+        with open(filename, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except (IOError, OSError):
+        return None
+
+
+def object_filename(obj):
+    """
+    Return the absolute path of the file in which *obj* is defined, or `None`
+    if this can't be determined (e.g. for built-in objects).
+    """
+    try:
+        filename = inspect.getsourcefile(obj) or inspect.getfile(obj)
+    except TypeError:
+        module = inspect.getmodule(obj)
+        if module is None or module is obj:
+            return None
+        return object_filename(module)
+    if filename is None or not os.path.isfile(filename):
+        return None
+    return os.path.abspath(filename)
+
+
+def module_filename(modname):
+    try:
+        __import__(modname)
+    except Exception:
+        return None
+    return object_filename(sys.modules[modname])
+
+
+def note_source_dependency(env, filename):
+    docname = env.temp_data.get('docname')
+    if docname is None or filename is None:
+        return
+    if not hasattr(env, 'source_dependencies'):
+        env.source_dependencies = {}
+        env.source_dependency_hashes = {}
+    env.source_dependencies.setdefault(docname, set()).add(filename)
+    if filename not in env.source_dependency_hashes:
+        env.source_dependency_hashes[filename] = file_digest(filename)
+
+
+def process_source(app, docname, source):
+    for modname in AUTOMOD_PATTERN.findall(source[0]):
+        note_source_dependency(app.env, module_filename(modname))
+
+
+def process_docstring(app, what, name, obj, options, lines):
+    note_source_dependency(app.env, object_filename(obj))
+
+
+def process_doctree(app, doctree):
+    for signode in doctree.traverse(addnodes.desc_signature):
+        modname = signode.get('module')
+        if not modname:
+            continue
+        note_source_dependency(app.env, module_filename(modname))
+        fullname = signode.get('fullname')
+        if not fullname:
+            continue
+        obj = import_object(modname, fullname)
+        if obj is not None:
+            note_source_dependency(app.env, object_filename(obj))
+
+
+def purge_dependencies(app, env, docname):
+    if hasattr(env, 'source_dependencies'):
+        env.source_dependencies.pop(docname, None)
+
+
+def merge_dependencies(app, env, docnames, other):
+    if not hasattr(other, 'source_dependencies'):
+        return
+    if not hasattr(env, 'source_dependencies'):
+        env.source_dependencies = {}
+        env.source_dependency_hashes = {}
+    for docname in docnames:
+        if docname in other.source_dependencies:
+            env.source_dependencies[docname] = \
+                other.source_dependencies[docname]
+    for filename, digest in other.source_dependency_hashes.items():
+        env.source_dependency_hashes.setdefault(filename, digest)
+
+
+def find_outdated(app, env, added, changed, removed):
+
+    if not getattr(env, 'source_dependencies', None):
+        return []
+
+    from sphinx.util import logging
+    info = logging.getLogger(__name__).info
+
+    hashes = env.source_dependency_hashes
+
+    modified = set()
+    for filename in set().union(*env.source_dependencies.values()):
+        digest = file_digest(filename)
+        if digest != hashes.get(filename):
+            modified.add(filename)
+            hashes[filename] = digest
+
+    if not modified:
+        return []
+
+    outdated = []
+    for docname, filenames in sorted(env.source_dependencies.items()):
+        if docname in removed:
+            continue
+        triggers = sorted(filenames & modified)
+        if triggers:
+            info('[source_dependencies] rebuilding {0} because {1} '
+                 'changed'.format(docname, ', '.join(triggers)))
+            if docname not in changed:
+                outdated.append(docname)
+
+    return outdated
+
+
+def setup(app):
+
+    app.setup_extension('sphinx.ext.autodoc')
+
+    app.connect('source-read', process_source)
+    app.connect('autodoc-process-docstring', process_docstring)
+    app.connect('doctree-read', process_doctree)
+    app.connect('env-purge-doc', purge_dependencies)
+    app.connect('env-merge-info', merge_dependencies)
+    app.connect('env-get-outdated', find_outdated)
+
+    return {'parallel_read_safe': True,
+            'parallel_write_safe': True}
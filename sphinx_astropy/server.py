@@ -0,0 +1,625 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+A resident build server for Sphinx documentation.
+
+Each ``sphinx-build`` invocation pays the cost of starting Python, importing
+the configuration (including matplotlib and the theme), importing the
+documented package, and loading the pickled environment before it reads a
+single file. The ``sphinx_astropy serve`` command instead keeps a process
+running in which all of these stay in memory, and runs an incremental build
+whenever a file in the source tree (or in one of the directories given with
+``--watch``) changes, or whenever a build is requested with::
+
+    sphinx_astropy build <outdir>
+
+which talks to the server over a Unix socket in the doctree directory that
+only the current user can access (a different path can be given with
+``--socket``). On platforms without Unix sockets, a TCP port on the local host
+is used instead (see ``--port``). The time taken by each build is reported.
+
+When a Python file in one of the directories given with ``--watch`` changes,
+all the modules imported from that directory are re-imported (so that packages
+which import objects from their submodules are updated too). A change to
+``conf.py`` or other Python files in the configuration directory (such as
+local extensions), to Sphinx extensions that are not installed in
+site-packages, to any other module that was imported, or to sphinx-astropy
+itself (which is always watched) causes the server process to restart
+completely. A restart can also be requested at any time with::
+
+    sphinx_astropy restart <outdir>
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import socket
+import sys
+import sysconfig
+import time
+from contextlib import closing
+from distutils.version import LooseVersion
+
+from sphinx import __version__
+from sphinx.application import Sphinx
+from sphinx.util.docutils import docutils_namespace, patch_docutils
+
+SPHINX_LT_20 = LooseVersion(__version__) < LooseVersion('2.0')
+
+DEFAULT_PORT = 8765
+
+SOCKET_FILENAME = 'server.sock'
+
+# Unix sockets can be restricted to the current user, so we only fall back to
+# a TCP port on platforms that don't support them.
+UNIX_SOCKETS = hasattr(socket, 'AF_UNIX')
+
+# The time in seconds that clients have to send their request
+REQUEST_TIMEOUT = 10
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STDLIB_DIR = os.path.abspath(sysconfig.get_paths()['stdlib'])
+
+# The environment from the last successful build, keyed by the filename of the
+# pickled environment, along with the modification time of that file.
+_environments = {}
+
+
+class WarmSphinx(Sphinx):
+    """
+    A Sphinx application that reuses the environment left in memory by the
+    previous build instead of unpickling it, provided that it was not changed
+    on disk in the meantime.
+    """
+
+    def _load_existing_env(self, filename):
+        cached = _environments.pop(filename, None)
+        if cached is not None and cached[0] == os.path.getmtime(filename):
+            # The previous application is discarded, so its environment can
+            # be handed over directly rather than copied.
+            env = cached[1]
+            try:
+                env.setup(self)
+            except Exception:
+                pass
+            else:
+                info('reusing the environment from the previous build')
+                self._fresh_env_used = False
+                return env
+        return super(WarmSphinx, self)._load_existing_env(filename)
+
+
+# Sphinx only loads the pickled environment in a method that can be overridden
+# as of Sphinx 5.1, so the environment is unpickled in every build otherwise.
+WARM_ENV_SUPPORTED = hasattr(Sphinx, '_load_existing_env')
+
+
+def module_file(module):
+    """
+    Return the absolute path of the source file of *module*, if any.
+    """
+    filename = getattr(module, '__file__', None)
+    if not filename:
+        return None
+    filename = os.path.abspath(filename)
+    if filename.endswith(('.pyc', '.pyo')):
+        filename = filename[:-1]
+    return filename
+
+
+def add_mtime(snapshot, path):
+    try:
+        snapshot[path] = os.path.getmtime(path)
+    except OSError:
+        pass
+
+
+def extension_files(app):
+    """
+    Return the source files of the Sphinx extensions used by *app* that are
+    not installed, e.g. extensions that are part of the documented package
+    but are loaded from outside the directories that are watched anyway.
+    """
+    filenames = set()
+    for extension in app.extensions.values():
+        filename = module_file(getattr(extension, 'module', None))
+        if filename is None:
+            continue
+        parts = filename.split(os.sep)
+        if 'site-packages' in parts or 'dist-packages' in parts:
+            continue
+        if filename.startswith(STDLIB_DIR + os.sep):
+            continue
+        filenames.add(filename)
+    return filenames
+
+
+def generated_dirs(app):
+    """
+    Return the directories in the source tree in which files are written
+    during the build, i.e. the API pages generated by automodapi and the
+    galleries generated by sphinx-gallery.
+    """
+    config = app.config
+    directories = []
+    toctreedirnm = getattr(config, 'automodapi_toctreedirnm', None)
+    if toctreedirnm:
+        directories.append(toctreedirnm)
+    gallery_conf = getattr(config, 'sphinx_gallery_conf', None) or {}
+    gallery_dirs = gallery_conf.get('gallery_dirs') or []
+    if not isinstance(gallery_dirs, (tuple, list)):
+        gallery_dirs = [gallery_dirs]
+    directories.extend(gallery_dirs)
+    if gallery_conf.get('backreferences_dir'):
+        directories.append(gallery_conf['backreferences_dir'])
+    return [os.path.abspath(os.path.join(app.srcdir, directory))
+            for directory in directories]
+
+
+def info(message):
+    print('[sphinx_astropy] ' + message)
+    sys.stdout.flush()
+
+
+class BuildServer(object):
+
+    def __init__(self, args):
+        self.args = args
+        self.srcdir = os.path.abspath(args.sourcedir)
+        self.confdir = os.path.abspath(args.confdir or args.sourcedir)
+        self.outdir = os.path.abspath(args.outdir)
+        self.doctreedir = os.path.abspath(
+            args.doctreedir or os.path.join(args.outdir, '.doctrees'))
+        self.watch_dirs = [os.path.abspath(path) for path in args.watch]
+        self.extension_files = set()
+        self.address = get_address(args)
+        self.server = None
+        self.connection = None
+        self.snapshot = self.take_snapshot()
+        if not WARM_ENV_SUPPORTED:
+            info('the installed version of Sphinx does not allow the '
+                 'environment to be reused, so it will be loaded from disk '
+                 'in each build')
+
+    def take_snapshot(self):
+        """
+        Return the modification times of all the files that are watched.
+        """
+        exclude = (self.outdir, self.doctreedir)
+        snapshot = {}
+        directories = [self.srcdir, self.confdir, PACKAGE_DIR]
+        for directory in directories + self.watch_dirs:
+            for root, dirs, files in os.walk(directory):
+                dirs[:] = [d for d in dirs if not d.startswith('.') and
+                           d != '__pycache__' and
+                           os.path.join(root, d) not in exclude]
+                for filename in files:
+                    if not filename.endswith(('.pyc', '.pyo')):
+                        add_mtime(snapshot, os.path.join(root, filename))
+        for path in self.extension_files:
+            add_mtime(snapshot, path)
+        return snapshot
+
+    def find_changes(self):
+        snapshot = self.take_snapshot()
+        changed = set(path for path in set(snapshot) | set(self.snapshot)
+                      if snapshot.get(path) != self.snapshot.get(path))
+        self.snapshot = snapshot
+        return changed
+
+    def watch_root(self, path):
+        """
+        Return the directory given with ``--watch`` that contains *path*, if
+        any.
+        """
+        for directory in self.watch_dirs:
+            if path.startswith(directory + os.sep):
+                return directory
+        return None
+
+    def needs_restart(self, path):
+        # Changes to the configuration or extension code can't be picked up
+        # by re-importing modules, so we need to start from scratch. This is
+        # also the case for any other module that was imported from outside
+        # the watched directories.
+        if not path.endswith('.py'):
+            return False
+        if (path.startswith(PACKAGE_DIR + os.sep) or
+                path in self.extension_files):
+            return True
+        if self.watch_root(path) is not None:
+            return False
+        if path.startswith(self.confdir + os.sep):
+            return True
+        return any(module_file(module) == path
+                   for module in list(sys.modules.values()))
+
+    def unload_modules(self, paths):
+        """
+        Remove all the modules that were loaded from the watched directories
+        containing any of the Python files in *paths*, so that they are
+        imported again in the next build. Whole directories are unloaded
+        rather than only the modules that changed since packages usually
+        import objects from their submodules.
+        """
+        roots = set(self.watch_root(path) for path in paths
+                    if path.endswith('.py'))
+        roots.discard(None)
+        if not roots:
+            return
+        for name, module in list(sys.modules.items()):
+            filename = module_file(module)
+            if filename and any(filename.startswith(root + os.sep)
+                                for root in roots):
+                del sys.modules[name]
+
+    def build(self, force_all=False, fresh_env=False):
+
+        args = self.args
+
+        confoverrides = {}
+        for item in args.define:
+            key, _, value = item.partition('=')
+            confoverrides[key] = value
+
+        start = time.time()
+
+        # Files changed by the user while the build is running should still
+        # trigger another build, so the snapshot is taken before the build.
+        snapshot = self.take_snapshot()
+        app = None
+
+        filename = os.path.join(self.doctreedir, 'environment.pickle')
+
+        # As in sphinx-build, the directives, roles and nodes registered by
+        # extensions have to be unregistered at the end of each build, since
+        # registering them again in the next build would emit warnings.
+        if SPHINX_LT_20:
+            patched_docutils = patch_docutils()
+        else:
+            patched_docutils = patch_docutils(self.confdir)
+
+        try:
+            with patched_docutils, docutils_namespace():
+                app = WarmSphinx(self.srcdir, self.confdir, self.outdir,
+                                 self.doctreedir, args.builder,
+                                 confoverrides=confoverrides,
+                                 freshenv=fresh_env or args.fresh_env,
+                                 warningiserror=args.warnings_as_errors,
+                                 parallel=args.jobs)
+                self.extension_files = extension_files(app)
+                app.build(force_all=force_all or args.write_all)
+                status = app.statuscode
+        except Exception as exc:
+            info('build failed: {0}'.format(exc))
+            status = 1
+        else:
+            if WARM_ENV_SUPPORTED and os.path.exists(filename):
+                _environments[filename] = (os.path.getmtime(filename),
+                                           app.env)
+
+        # Files written during the build itself (e.g. by automodapi or
+        # sphinx-gallery) should not trigger another build.
+        # Similarly, the extensions that were loaded for the first time are
+        # now watched, but that shouldn't count as a change either.
+        if app is not None:
+            generated = generated_dirs(app)
+            current = self.take_snapshot()
+            for path in set(snapshot) | set(current):
+                if (path in self.extension_files and path not in snapshot or
+                        any(path.startswith(directory + os.sep)
+                            for directory in generated)):
+                    if path in current:
+                        snapshot[path] = current[path]
+                    else:
+                        snapshot.pop(path, None)
+        self.snapshot = snapshot
+
+        seconds = time.time() - start
+        info('build finished in {0:.2f}s with status {1}'.format(seconds,
+                                                                 status))
+
+        return status, seconds
+
+    def check_changes(self):
+        """
+        Check for changes to the watched files, restarting the process if
+        needed. Returns whether any files changed.
+        """
+        changed = self.find_changes()
+        for path in sorted(changed):
+            info('changed: {0}'.format(path))
+        if any(self.needs_restart(path) for path in changed):
+            self.restart()
+        self.unload_modules(changed)
+        return bool(changed)
+
+    def restart(self):
+        info('restarting')
+        # Sockets are inherited by the new process on Python 2
+        self.close_sockets()
+        os.execv(sys.executable,
+                 [sys.executable, '-m', 'sphinx_astropy'] + sys.argv[1:])
+
+    def open_socket(self):
+        """
+        Return a socket listening for requests, or `None` if another server
+        is already running.
+        """
+        if not UNIX_SOCKETS:
+            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server.bind(('127.0.0.1', self.address))
+            return server
+        if os.path.exists(self.address):
+            try:
+                connection = open_connection(self.address)
+            except (IOError, OSError):
+                # Left over from a server that didn't exit cleanly
+                os.remove(self.address)
+            else:
+                connection.close()
+                return None
+        directory = os.path.dirname(self.address)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Only the current user should be able to send requests
+        umask = os.umask(0o177)
+        try:
+            server.bind(self.address)
+        finally:
+            os.umask(umask)
+        return server
+
+    def close_sockets(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+            if UNIX_SOCKETS and os.path.exists(self.address):
+                os.remove(self.address)
+
+    def read_request(self, connection):
+        connection.settimeout(REQUEST_TIMEOUT)
+        reader = connection.makefile('rb')
+        try:
+            line = reader.readline()
+        finally:
+            reader.close()
+        connection.settimeout(None)
+        request = json.loads(line.decode('utf-8') or '{}')
+        if not isinstance(request, dict):
+            raise ValueError('request should be a JSON object')
+        return request
+
+    def handle_request(self, connection):
+        """
+        Handle a request sent over *connection* and return the command, or
+        `None` if the request could not be read.
+        """
+
+        self.connection = connection
+
+        try:
+
+            try:
+                request = self.read_request(connection)
+            except (ValueError, IOError, OSError) as exc:
+                info('ignoring invalid request: {0}'.format(exc))
+                return None
+
+            command = request.get('command', 'build')
+            if command == 'build':
+                self.check_changes()
+                status, seconds = self.build(
+                    force_all=request.get('force_all', False),
+                    fresh_env=request.get('fresh_env', False))
+                response = {'status': status, 'seconds': seconds}
+            elif command in ('restart', 'stop'):
+                response = {'status': 0}
+            else:
+                response = {'status': 1,
+                            'error': 'unknown command: {0}'.format(command)}
+
+            # The client may have gone away in the meantime, e.g. if the
+            # user interrupted ``sphinx_astropy build``.
+            try:
+                connection.sendall(
+                    (json.dumps(response) + '\n').encode('utf-8'))
+            except (IOError, OSError) as exc:
+                info('could not send the response: {0}'.format(exc))
+
+            return command
+
+        finally:
+            connection.close()
+            self.connection = None
+
+    def serve(self):
+
+        server = self.open_socket()
+        if server is None:
+            info('a server is already running on {0}'.format(self.address))
+            return 1
+
+        self.server = server
+        server.listen(5)
+        server.settimeout(self.args.interval)
+
+        if UNIX_SOCKETS:
+            info('listening on {0}'.format(self.address))
+        else:
+            info('listening on 127.0.0.1:{0}'.format(self.address))
+
+        try:
+
+            self.build()
+
+            while True:
+
+                try:
+                    connection, address = server.accept()
+                except socket.timeout:
+                    if self.check_changes():
+                        self.build()
+                    continue
+
+                command = self.handle_request(connection)
+
+                if command == 'stop':
+                    return 0
+                elif command == 'restart':
+                    self.restart()
+
+        finally:
+            self.close_sockets()
+
+
+def get_address(args):
+    """
+    Return the path of the socket used to communicate with the server, or the
+    port on platforms without Unix sockets. Returns `None` if neither the
+    socket nor the output directory was given.
+    """
+    if not UNIX_SOCKETS:
+        return args.port
+    if args.socket:
+        return os.path.abspath(args.socket)
+    if args.outdir is None:
+        return None
+    doctreedir = args.doctreedir or os.path.join(args.outdir, '.doctrees')
+    return os.path.join(os.path.abspath(doctreedir), SOCKET_FILENAME)
+
+
+def open_connection(address):
+    if not UNIX_SOCKETS:
+        return socket.create_connection(('127.0.0.1', address))
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(address)
+    except Exception:
+        connection.close()
+        raise
+    return connection
+
+
+def send_request(address, request):
+    connection = open_connection(address)
+    with closing(connection):
+        connection.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        reader = connection.makefile('rb')
+        try:
+            response = reader.readline().decode('utf-8')
+        finally:
+            reader.close()
+    if not response:
+        # The server closed the connection without replying, which happens
+        # when it restarts because of a change to the configuration.
+        print('the server is restarting')
+        return None
+    return json.loads(response)
+
+
+def add_client_arguments(parser):
+    parser.add_argument('outdir', nargs='?',
+                        help='the output directory given to the server, used '
+                             'to find the socket')
+    parser.add_argument('-d', dest='doctreedir')
+
+
+def get_parser():
+
+    parser = argparse.ArgumentParser(
+        prog='sphinx_astropy',
+        description='Resident Sphinx build server which keeps imports and '
+                    'the build environment in memory between builds.')
+    parser.add_argument('--socket',
+                        help='the Unix socket used to communicate with the '
+                             'server (default: {0} in the doctree '
+                             'directory)'.format(SOCKET_FILENAME))
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help='the local port used to communicate with the '
+                             'server on platforms without Unix sockets '
+                             '(default: {0})'.format(DEFAULT_PORT))
+
+    subparsers = parser.add_subparsers(dest='command')
+
+    serve = subparsers.add_parser(
+        'serve', help='start the build server and watch for changes')
+    serve.add_argument('sourcedir')
+    serve.add_argument('outdir')
+    serve.add_argument('-b', dest='builder', default='html')
+    serve.add_argument('-c', dest='confdir')
+    serve.add_argument('-d', dest='doctreedir')
+    serve.add_argument('-j', dest='jobs', type=int, default=1)
+    serve.add_argument('-D', dest='define', action='append', default=[],
+                       metavar='setting=value')
+    serve.add_argument('-W', dest='warnings_as_errors', action='store_true')
+    serve.add_argument('-a', dest='write_all', action='store_true')
+    serve.add_argument('-E', dest='fresh_env', action='store_true',
+                       help='use a fresh environment for the first build')
+    serve.add_argument('--watch', action='append', default=[],
+                       metavar='DIR',
+                       help='additional directory to watch for changes, '
+                            'e.g. the documented package')
+    serve.add_argument('--interval', type=float, default=1.,
+                       help='interval in seconds between checks for '
+                            'changes (default: 1)')
+
+    build = subparsers.add_parser(
+        'build', help='ask the running server to build the documentation')
+    add_client_arguments(build)
+    build.add_argument('-a', dest='force_all', action='store_true')
+    build.add_argument('-E', dest='fresh_env', action='store_true')
+
+    restart = subparsers.add_parser('restart',
+                                    help='restart the running server')
+    add_client_arguments(restart)
+
+    stop = subparsers.add_parser('stop', help='stop the running server')
+    add_client_arguments(stop)
+
+    return parser
+
+
+def main(argv=None):
+
+    parser = get_parser()
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        return BuildServer(args).serve()
+
+    if args.command not in ('build', 'restart', 'stop'):
+        parser.print_help()
+        return 1
+
+    address = get_address(args)
+    if address is None:
+        parser.error('either the output directory or --socket is required')
+
+    if args.command == 'build':
+        request = {'command': 'build',
+                   'force_all': args.force_all,
+                   'fresh_env': args.fresh_env}
+    else:
+        request = {'command': args.command}
+
+    try:
+        response = send_request(address, request)
+    except (IOError, OSError) as exc:
+        print('could not connect to the server: {0}'.format(exc))
+        return 1
+
+    if args.command != 'build':
+        return 0
+    if response is None:
+        return 1
+    print('build finished in {0:.2f}s with status {1}'.format(
+        response['seconds'], response['status']))
+    return response['status']
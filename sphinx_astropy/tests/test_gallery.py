@@ -0,0 +1,136 @@
+import os
+import signal
+
+from .test_conf import build_main, generate_files
+
+GALLERY_CONF = """
+extensions = extensions + ['sphinx_astropy.ext.gallery']
+sphinx_gallery_conf = dict(sphinx_gallery_conf, examples_dirs='examples',
+                           image_scrapers=(), reset_modules=())
+gallery_timeout = 2
+"""
+
+GALLERY_INDEX = """
+Title
+=====
+
+.. toctree::
+
+   generated/examples/index
+"""
+
+GALLERY_README = """
+Examples
+========
+"""
+
+FAST_EXAMPLE = '''
+"""
+Fast example
+============
+"""
+print('fast')
+'''
+
+SLOW_EXAMPLE = '''
+"""
+Slow example
+============
+"""
+import time
+time.sleep(30)
+'''
+
+
+def generate_gallery_files(tmpdir):
+
+    generate_files(tmpdir)
+
+    with open(tmpdir.join('conf.py').strpath, 'a') as f:
+        f.write(GALLERY_CONF)
+
+    with open(tmpdir.join('index.rst').strpath, 'w') as f:
+        f.write(GALLERY_INDEX)
+
+    examples = tmpdir.mkdir('examples')
+
+    with open(examples.join('README.txt').strpath, 'w') as f:
+        f.write(GALLERY_README)
+
+    with open(examples.join('plot_fast.py').strpath, 'w') as f:
+        f.write(FAST_EXAMPLE)
+
+    return examples
+
+
+def test_gallery(tmpdir, capsys):
+
+    examples = generate_gallery_files(tmpdir)
+
+    # Examples starting with skip_ should not be executed (and so should not
+    # time out), even though they are included in the gallery
+    with open(examples.join('skip_slow.py').strpath, 'w') as f:
+        f.write(SLOW_EXAMPLE)
+
+    src_dir = tmpdir.strpath
+    html_dir = tmpdir.mkdir('html').strpath
+
+    argv = ['-b', 'html', src_dir, html_dir, '-D', 'disable_intersphinx=1']
+
+    status = build_main(argv=argv)
+    assert status == 0
+
+    captured = capsys.readouterr()
+    assert 'Slowest examples' in captured.out
+    assert 'examples will be run serially since sphinx-build was not run ' \
+           'with -j' in captured.out
+    assert os.path.join('generated', 'examples', 'plot_fast.rst') in captured.out
+
+    assert os.path.exists(os.path.join(html_dir, 'generated', 'examples',
+                                       'plot_fast.html'))
+    assert os.path.exists(os.path.join(html_dir, 'generated', 'examples',
+                                       'skip_slow.html'))
+
+
+def test_gallery_timeout(tmpdir, capsys):
+
+    previous_handler = signal.getsignal(signal.SIGALRM)
+
+    examples = generate_gallery_files(tmpdir)
+
+    with open(examples.join('plot_slow.py').strpath, 'w') as f:
+        f.write(SLOW_EXAMPLE)
+
+    src_dir = tmpdir.strpath
+    html_dir = tmpdir.mkdir('html').strpath
+
+    argv = ['-b', 'html', src_dir, html_dir, '-D', 'disable_intersphinx=1']
+
+    status = build_main(argv=argv)
+    assert status != 0
+
+    captured = capsys.readouterr()
+    assert 'did not complete within 2 seconds' in captured.err
+
+    # The alarm should not outlive the example
+    assert signal.getitimer(signal.ITIMER_REAL) == (0., 0.)
+    assert signal.getsignal(signal.SIGALRM) is previous_handler
+
+
+def test_gallery_timeout_reset_order(tmpdir, capsys):
+
+    generate_gallery_files(tmpdir)
+
+    with open(tmpdir.join('conf.py').strpath, 'a') as f:
+        f.write("sphinx_gallery_conf['reset_modules_order'] = 'after'\n")
+
+    src_dir = tmpdir.strpath
+    html_dir = tmpdir.mkdir('html').strpath
+
+    argv = ['-b', 'html', src_dir, html_dir, '-D', 'disable_intersphinx=1']
+
+    status = build_main(argv=argv)
+    assert status == 0
+
+    captured = capsys.readouterr()
+    assert "requires reset_modules_order to be 'both'" in captured.err
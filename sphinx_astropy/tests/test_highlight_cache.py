@@ -0,0 +1,56 @@
+import os
+
+from .test_conf import build_main, generate_files
+
+HIGHLIGHT_CACHE_CONF = """
+extensions = extensions + ['sphinx_astropy.ext.highlight_cache']
+"""
+
+HIGHLIGHT_CACHE_INDEX = """
+Title
+=====
+
+.. code-block:: python
+
+    import numpy as np
+    x = np.arange(10)
+
+.. doctest-skip::
+
+    >>> print('hello')
+    hello
+"""
+
+
+def test_highlight_cache(tmpdir, capsys):
+
+    generate_files(tmpdir)
+
+    with open(tmpdir.join('conf.py').strpath, 'a') as f:
+        f.write(HIGHLIGHT_CACHE_CONF)
+
+    with open(tmpdir.join('index.rst').strpath, 'w') as f:
+        f.write(HIGHLIGHT_CACHE_INDEX)
+
+    src_dir = tmpdir.strpath
+    html_dir = tmpdir.mkdir('html').strpath
+
+    argv = ['-W', '-b', 'html', src_dir, html_dir, '-D', 'disable_intersphinx=1']
+
+    status = build_main(argv=argv)
+    assert status == 0
+
+    captured = capsys.readouterr()
+    assert '0 hits, 2 misses' in captured.out
+
+    with open(os.path.join(html_dir, 'index.html')) as f:
+        expected = f.read()
+
+    status = build_main(argv=argv + ['-E'])
+    assert status == 0
+
+    captured = capsys.readouterr()
+    assert '2 hits, 0 misses (100.0% hit rate)' in captured.out
+
+    with open(os.path.join(html_dir, 'index.html')) as f:
+        assert f.read() == expected
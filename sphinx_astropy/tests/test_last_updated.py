@@ -0,0 +1,69 @@
+import os
+import subprocess
+
+from .test_conf import build_main, generate_files
+
+LAST_UPDATED_CONF = """
+extensions = extensions + ['sphinx_astropy.ext.last_updated']
+html_last_updated_fmt = '%Y-%m-%d'
+"""
+
+LAST_UPDATED_INDEX = """
+Title
+=====
+
+.. toctree::
+
+   other
+"""
+
+OTHER_PAGE = """
+Other
+=====
+
+Just text
+"""
+
+
+def git_commit(cwd, paths, date):
+    env = dict(os.environ,
+               GIT_AUTHOR_NAME='Astropy', GIT_AUTHOR_EMAIL='astropy@example.com',
+               GIT_COMMITTER_NAME='Astropy',
+               GIT_COMMITTER_EMAIL='astropy@example.com',
+               GIT_AUTHOR_DATE=date, GIT_COMMITTER_DATE=date)
+    subprocess.check_call(['git', 'add'] + paths, cwd=cwd, env=env)
+    subprocess.check_call(['git', 'commit', '-q', '-m', 'Commit'], cwd=cwd,
+                          env=env)
+
+
+def test_last_updated(tmpdir):
+
+    src_dir = tmpdir.mkdir('docs')
+
+    generate_files(src_dir)
+
+    with open(src_dir.join('conf.py').strpath, 'a') as f:
+        f.write(LAST_UPDATED_CONF)
+
+    src_dir.join('index.rst').write(LAST_UPDATED_INDEX)
+    src_dir.join('other.rst').write(OTHER_PAGE)
+
+    subprocess.check_call(['git', 'init', '-q'], cwd=tmpdir.strpath)
+    git_commit(tmpdir.strpath, ['docs'], '2015-01-01T12:00:00')
+
+    src_dir.join('other.rst').write(OTHER_PAGE + '\nMore text\n')
+    git_commit(tmpdir.strpath, ['docs/other.rst'], '2018-06-01T12:00:00')
+
+    html_dir = tmpdir.mkdir('html').strpath
+
+    argv = ['-W', '-b', 'html', src_dir.strpath, html_dir,
+            '-D', 'disable_intersphinx=1']
+
+    status = build_main(argv=argv)
+    assert status == 0
+
+    with open(os.path.join(html_dir, 'index.html')) as f:
+        assert '2015-01-01' in f.read()
+
+    with open(os.path.join(html_dir, 'other.html')) as f:
+        assert '2018-06-01' in f.read()
@@ -0,0 +1,79 @@
+import json
+import os
+
+from .test_conf import build_main, generate_files
+
+MANIFEST_CONF = """
+extensions = extensions + ['sphinx_astropy.ext.output_manifest']
+output_manifest_file = '../manifest.json'
+"""
+
+
+def test_output_manifest(tmpdir, capsys):
+
+    generate_files(tmpdir)
+
+    with open(tmpdir.join('conf.py').strpath, 'a') as f:
+        f.write(MANIFEST_CONF)
+
+    src_dir = tmpdir.strpath
+    html_dir = tmpdir.mkdir('html').strpath
+    manifest_file = tmpdir.join('manifest.json').strpath
+
+    argv = ['-W', '-b', 'html', src_dir, html_dir, '-D', 'disable_intersphinx=1']
+
+    status = build_main(argv=argv)
+    assert status == 0
+
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+
+    assert 'index.html' in manifest['added']
+    assert manifest['changed'] == manifest['removed'] == []
+
+    # Rebuilding without changes should leave the output untouched
+    index = os.path.join(html_dir, 'index.html')
+    mtime = os.path.getmtime(index)
+
+    status = build_main(argv=argv + ['-E'])
+    assert status == 0
+
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+
+    assert manifest == {'changed': [], 'added': [], 'removed': []}
+    assert os.path.getmtime(index) == mtime
+
+    # Changing the content should only list the affected page
+    with open(tmpdir.join('index.rst').strpath, 'a') as f:
+        f.write('\nMore text\n')
+
+    status = build_main(argv=argv)
+    assert status == 0
+
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+
+    assert 'index.html' in manifest['changed']
+    assert manifest['added'] == manifest['removed'] == []
+
+    # Touching the source without changing it rewrites the page once, after
+    # which it should no longer be considered outdated.
+    os.utime(tmpdir.join('index.rst').strpath, None)
+
+    status = build_main(argv=argv)
+    assert status == 0
+
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+
+    assert manifest == {'changed': [], 'added': [], 'removed': []}
+
+    mtime = os.path.getmtime(index)
+    capsys.readouterr()
+
+    status = build_main(argv=argv)
+    assert status == 0
+
+    assert 'no targets are out of date' in capsys.readouterr().out
+    assert os.path.getmtime(index) == mtime
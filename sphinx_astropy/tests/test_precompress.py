@@ -0,0 +1,79 @@
+import gzip
+import os
+
+import pytest
+
+from .test_conf import build_main, generate_files
+
+PRECOMPRESS_CONF = """
+extensions = extensions + ['sphinx_astropy.ext.precompress']
+precompress_workers = 2
+"""
+
+
+def test_precompress(tmpdir, capsys):
+
+    generate_files(tmpdir)
+
+    with open(tmpdir.join('conf.py').strpath, 'a') as f:
+        f.write(PRECOMPRESS_CONF)
+
+    src_dir = tmpdir.strpath
+    html_dir = tmpdir.mkdir('html').strpath
+
+    argv = ['-W', '-b', 'html', src_dir, html_dir, '-D', 'disable_intersphinx=1']
+
+    status = build_main(argv=argv)
+    assert status == 0
+
+    index = os.path.join(html_dir, 'index.html')
+    with open(index, 'rb') as f:
+        original = f.read()
+    with gzip.open(index + '.gz', 'rb') as f:
+        assert f.read() == original
+
+    assert os.path.exists(os.path.join(html_dir, 'searchindex.js.gz'))
+
+    captured = capsys.readouterr()
+    assert 'compressed 0 of' not in captured.out
+    assert 'bytes saved' in captured.out
+
+    # A second build with no changes should not recompress anything
+    mtime = os.path.getmtime(index + '.gz')
+
+    status = build_main(argv=argv)
+    assert status == 0
+
+    captured = capsys.readouterr()
+    assert 'compressed 0 of' in captured.out
+    assert os.path.getmtime(index + '.gz') == mtime
+
+
+def test_precompress_toggle_brotli(tmpdir):
+
+    pytest.importorskip('brotli')
+
+    generate_files(tmpdir)
+
+    with open(tmpdir.join('conf.py').strpath, 'a') as f:
+        f.write(PRECOMPRESS_CONF)
+
+    src_dir = tmpdir.strpath
+    html_dir = tmpdir.mkdir('html').strpath
+    index = os.path.join(html_dir, 'index.html')
+
+    argv = ['-W', '-b', 'html', src_dir, html_dir, '-D', 'disable_intersphinx=1']
+
+    status = build_main(argv=argv + ['-D', 'precompress_brotli=1'])
+    assert status == 0
+
+    assert os.path.exists(index + '.gz')
+    assert os.path.exists(index + '.br')
+
+    # Disabling brotli should remove the .br files rather than leaving them
+    # to go out of date.
+    status = build_main(argv=argv + ['-D', 'precompress_brotli=0'])
+    assert status == 0
+
+    assert os.path.exists(index + '.gz')
+    assert not os.path.exists(index + '.br')
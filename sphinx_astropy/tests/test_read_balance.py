@@ -0,0 +1,114 @@
+from sphinx.util.parallel import make_chunks
+
+from sphinx_astropy.ext.read_balance import balance_docnames, worker_times
+
+from .test_conf import build_main, generate_files
+
+READ_BALANCE_CONF = """
+extensions = extensions + ['sphinx_astropy.ext.read_balance']
+"""
+
+SERIAL_CONF = """
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+extensions = extensions + ['serial_extension']
+"""
+
+SERIAL_EXTENSION = """
+def setup(app):
+    return {'parallel_read_safe': False}
+"""
+
+
+def test_balance_docnames():
+
+    # Expensive documents that sort together end up in the same chunk by
+    # default, so one process does all the work.
+    docnames = ['api/{0}'.format(i) for i in range(8)]
+    docnames += ['page{0:02d}'.format(i) for i in range(24)]
+    costs = dict((docname, 10. if docname.startswith('api') else 1.)
+                 for docname in docnames)
+
+    def balance(docnames):
+        chunks = make_chunks(docnames, 4)
+        workers = worker_times([sum(costs[docname] for docname in chunk)
+                                for chunk in chunks], 4)
+        return max(workers) / (sum(workers) / len(workers))
+
+    balanced = balance_docnames(docnames, costs, 4)
+
+    assert sorted(balanced) == sorted(docnames)
+    assert balance(docnames) > 1.5
+    assert balance(balanced) < 1.1
+
+
+def generate_read_balance_files(tmpdir):
+
+    generate_files(tmpdir)
+
+    with open(tmpdir.join('conf.py').strpath, 'a') as f:
+        f.write(READ_BALANCE_CONF)
+
+    with open(tmpdir.join('index.rst').strpath, 'a') as f:
+        f.write('\n.. toctree::\n   :glob:\n\n   page*\n')
+
+    for i in range(12):
+        with open(tmpdir.join('page{0:02d}.rst'.format(i)).strpath, 'w') as f:
+            f.write('Page {0}\n=======\n\nSome text\n'.format(i))
+
+
+def test_read_balance(tmpdir, capsys):
+
+    generate_read_balance_files(tmpdir)
+
+    src_dir = tmpdir.strpath
+    html_dir = tmpdir.mkdir('html').strpath
+
+    argv = ['-W', '-j', '2', '-b', 'html', src_dir, html_dir,
+            '-D', 'disable_intersphinx=1']
+
+    status = build_main(argv=argv)
+    assert status == 0
+
+    captured = capsys.readouterr()
+    assert 'read 13 documents in' in captured.out
+    assert 'max/mean process time' in captured.out
+
+    # Make all documents outdated so that they are read again, this time
+    # using the read times from the first build.
+    for path in tmpdir.listdir('*.rst'):
+        path.setmtime(path.mtime() + 10)
+
+    status = build_main(argv=argv)
+    assert status == 0
+
+    captured = capsys.readouterr()
+    assert 'read 13 documents in' in captured.out
+
+
+def test_read_balance_serial(tmpdir, capsys):
+
+    # If any extension is not safe for parallel reading, Sphinx reads the
+    # documents serially, so there is no load balance to report.
+
+    generate_read_balance_files(tmpdir)
+
+    with open(tmpdir.join('conf.py').strpath, 'a') as f:
+        f.write(SERIAL_CONF)
+
+    with open(tmpdir.join('serial_extension.py').strpath, 'w') as f:
+        f.write(SERIAL_EXTENSION)
+
+    src_dir = tmpdir.strpath
+    html_dir = tmpdir.mkdir('html').strpath
+
+    argv = ['-j', '2', '-b', 'html', src_dir, html_dir,
+            '-D', 'disable_intersphinx=1']
+
+    status = build_main(argv=argv)
+    assert status == 0
+
+    captured = capsys.readouterr()
+    assert 'not safe for parallel reading' in captured.err
+    assert 'max/mean process time' not in captured.out
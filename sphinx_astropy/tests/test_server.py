@@ -0,0 +1,357 @@
+import os
+import socket
+import stat
+import sys
+import threading
+import time
+
+import pytest
+
+from sphinx_astropy import server
+
+from .test_conf import generate_files
+
+# Unlike the configuration used by the other tests, this doesn't suppress the
+# warnings emitted when extensions register the same directives, roles and
+# nodes again, since each build in the server has to start from scratch.
+SERVER_CONF = """
+from sphinx_astropy.conf import *
+"""
+
+PACKAGE_CONF = """
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'src'))
+extensions = extensions + ['sphinx_astropy.ext.source_dependencies']
+"""
+
+PACKAGE_INIT = """
+from .core import f
+"""
+
+PACKAGE_CORE = """
+def f():
+    \"\"\"
+    {0}
+    \"\"\"
+"""
+
+PACKAGE_INDEX = """
+Title
+=====
+
+.. currentmodule:: serverpkg
+
+.. autofunction:: f
+"""
+
+
+def test_build_server(tmpdir, capsys):
+
+    generate_files(tmpdir)
+
+    with open(tmpdir.join('conf.py').strpath, 'w') as f:
+        f.write(SERVER_CONF)
+
+    src_dir = tmpdir.strpath
+    html_dir = tmpdir.join('html').strpath
+
+    args = server.get_parser().parse_args(['serve', src_dir, html_dir, '-W',
+                                           '-D', 'disable_intersphinx=1'])
+
+    build_server = server.BuildServer(args)
+
+    status, seconds = build_server.build()
+    assert status == 0
+
+    env_filename = os.path.join(html_dir, '.doctrees', 'environment.pickle')
+    assert env_filename in server._environments
+
+    # Changes should be detected once and picked up by the next build
+    with open(tmpdir.join('index.rst').strpath, 'a') as f:
+        f.write('\nMore text\n')
+
+    assert build_server.check_changes()
+    assert not build_server.check_changes()
+
+    capsys.readouterr()
+
+    status, seconds = build_server.build()
+    assert status == 0
+
+    if server.WARM_ENV_SUPPORTED:
+        assert 'reusing the environment' in capsys.readouterr().out
+
+    with open(os.path.join(html_dir, 'index.html')) as f:
+        assert 'More text' in f.read()
+
+    # Rebuilding everything should also work with -W
+    status, seconds = build_server.build(force_all=True, fresh_env=True)
+    assert status == 0
+
+
+def test_build_server_reexport(tmpdir, monkeypatch):
+
+    # Objects imported by a package from its submodules should be updated
+    # when the submodule changes.
+
+    generate_files(tmpdir)
+
+    with open(tmpdir.join('conf.py').strpath, 'w') as f:
+        f.write(SERVER_CONF + PACKAGE_CONF)
+
+    with open(tmpdir.join('index.rst').strpath, 'w') as f:
+        f.write(PACKAGE_INDEX)
+
+    package = tmpdir.mkdir('src').mkdir('serverpkg')
+
+    with open(package.join('__init__.py').strpath, 'w') as f:
+        f.write(PACKAGE_INIT)
+
+    with open(package.join('core.py').strpath, 'w') as f:
+        f.write(PACKAGE_CORE.format('Original docstring'))
+
+    src_dir = tmpdir.strpath
+    html_dir = tmpdir.join('html').strpath
+
+    args = server.get_parser().parse_args(['serve', src_dir, html_dir, '-W',
+                                           '-D', 'disable_intersphinx=1',
+                                           '--watch', package.strpath])
+
+    build_server = server.BuildServer(args)
+
+    def restart():
+        raise AssertionError('the server should not restart')
+
+    monkeypatch.setattr(build_server, 'restart', restart)
+
+    try:
+
+        status, seconds = build_server.build()
+        assert status == 0
+
+        with open(os.path.join(html_dir, 'index.html')) as f:
+            assert 'Original docstring' in f.read()
+
+        with open(package.join('core.py').strpath, 'w') as f:
+            f.write(PACKAGE_CORE.format('Updated docstring'))
+
+        assert build_server.check_changes()
+        assert 'serverpkg' not in sys.modules
+
+        status, seconds = build_server.build()
+        assert status == 0
+
+        with open(os.path.join(html_dir, 'index.html')) as f:
+            assert 'Updated docstring' in f.read()
+
+    finally:
+        for name in list(sys.modules):
+            if name.split('.')[0] == 'serverpkg':
+                del sys.modules[name]
+
+
+def make_server(tmpdir, *extra_args):
+    generate_files(tmpdir)
+    with open(tmpdir.join('conf.py').strpath, 'w') as f:
+        f.write(SERVER_CONF)
+    args = server.get_parser().parse_args(
+        ['serve', tmpdir.strpath, tmpdir.join('html').strpath,
+         '-D', 'disable_intersphinx=1'] + list(extra_args))
+    return server.BuildServer(args)
+
+
+@pytest.mark.skipif(not hasattr(socket, 'socketpair'),
+                    reason='requires socket.socketpair')
+def test_build_server_bad_requests(tmpdir):
+
+    # Invalid requests and clients that go away should not stop the server
+
+    build_server = make_server(tmpdir)
+
+    for request in (b'not json\n', b'[1, 2]\n'):
+        client, connection = socket.socketpair()
+        client.sendall(request)
+        assert build_server.handle_request(connection) is None
+        client.close()
+
+    client, connection = socket.socketpair()
+    client.sendall(b'{"command": "stop"}\n')
+    client.close()
+    assert build_server.handle_request(connection) == 'stop'
+
+
+@pytest.mark.skipif(not server.UNIX_SOCKETS, reason='requires Unix sockets')
+def test_build_server_socket(tmpdir, monkeypatch):
+
+    build_server = make_server(tmpdir, '--interval', '0.1')
+
+    def restart():
+        raise AssertionError('the server should not restart')
+
+    monkeypatch.setattr(build_server, 'restart', restart)
+
+    socket_path = tmpdir.join('html', '.doctrees', 'server.sock').strpath
+    assert build_server.address == socket_path
+
+    result = []
+    thread = threading.Thread(
+        target=lambda: result.append(build_server.serve()))
+    thread.start()
+
+    try:
+
+        for attempt in range(100):
+            if os.path.exists(socket_path):
+                break
+            time.sleep(0.1)
+
+        # Only the current user should be able to connect
+        assert stat.S_IMODE(os.stat(socket_path).st_mode) & 0o077 == 0
+
+        html_dir = tmpdir.join('html').strpath
+        assert server.main(['build', html_dir]) == 0
+
+        # A second server for the same output should refuse to start
+        assert server.BuildServer(build_server.args).serve() == 1
+
+    finally:
+        server.main(['--socket', socket_path, 'stop'])
+        thread.join(60)
+
+    assert result == [0]
+    assert not os.path.exists(socket_path)
+
+
+LOCAL_EXTENSION_CONF = """
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'exts'))
+extensions = extensions + ['serverext']
+"""
+
+LOCAL_EXTENSION = """
+def setup(app):
+    return {'parallel_read_safe': True, 'parallel_write_safe': True}
+"""
+
+
+def test_build_server_restart(tmpdir, monkeypatch):
+
+    # Changes to sphinx-astropy and to extensions loaded from outside the
+    # watched directories should cause the server to restart
+
+    docs = tmpdir.mkdir('docs')
+    generate_files(docs)
+
+    with open(docs.join('conf.py').strpath, 'w') as f:
+        f.write(SERVER_CONF + LOCAL_EXTENSION_CONF)
+
+    extension = tmpdir.mkdir('exts').join('serverext.py')
+    with open(extension.strpath, 'w') as f:
+        f.write(LOCAL_EXTENSION)
+
+    args = server.get_parser().parse_args(['serve', docs.strpath,
+                                           docs.join('html').strpath,
+                                           '-D', 'disable_intersphinx=1'])
+
+    build_server = server.BuildServer(args)
+
+    restarts = []
+    monkeypatch.setattr(build_server, 'restart',
+                        lambda: restarts.append(True))
+
+    try:
+
+        status, seconds = build_server.build()
+        assert status == 0
+
+        assert os.path.join(server.PACKAGE_DIR,
+                            'server.py') in build_server.snapshot
+        assert extension.strpath in build_server.snapshot
+
+        extension.setmtime(extension.mtime() + 10)
+
+        assert build_server.check_changes()
+        assert restarts == [True]
+
+    finally:
+        sys.modules.pop('serverext', None)
+
+
+AUTOMODAPI_INDEX = """
+Title
+=====
+
+.. automodapi:: serverpkg
+"""
+
+EDIT_DURING_BUILD_CONF = """
+def edit_source(app, exception):
+    # Simulate the user saving a file while the build is running
+    path = os.path.join(app.srcdir, 'index.rst')
+    if not os.path.exists(path + '.edited'):
+        open(path + '.edited', 'w').close()
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+
+def setup(app):
+    app.connect('build-finished', edit_source)
+"""
+
+
+def test_build_server_changes_during_build(tmpdir, monkeypatch):
+
+    generate_files(tmpdir)
+
+    with open(tmpdir.join('conf.py').strpath, 'w') as f:
+        f.write(SERVER_CONF + PACKAGE_CONF + EDIT_DURING_BUILD_CONF)
+
+    with open(tmpdir.join('index.rst').strpath, 'w') as f:
+        f.write(AUTOMODAPI_INDEX)
+
+    package = tmpdir.mkdir('src').mkdir('serverpkg')
+
+    with open(package.join('__init__.py').strpath, 'w') as f:
+        f.write(PACKAGE_INIT)
+
+    with open(package.join('core.py').strpath, 'w') as f:
+        f.write(PACKAGE_CORE.format('Original docstring'))
+
+    args = server.get_parser().parse_args(['serve', tmpdir.strpath,
+                                           tmpdir.join('html').strpath,
+                                           '-D', 'disable_intersphinx=1',
+                                           '--watch', package.strpath])
+
+    build_server = server.BuildServer(args)
+
+    def restart():
+        raise AssertionError('the server should not restart')
+
+    monkeypatch.setattr(build_server, 'restart', restart)
+
+    try:
+
+        status, seconds = build_server.build()
+        assert status == 0
+
+        # automodapi wrote the API pages in the source tree during the
+        # build, which should be ignored, but the source that was saved
+        # during the build should trigger another build.
+        assert tmpdir.join('api').check(dir=True)
+        assert build_server.find_changes() == set([
+            tmpdir.join('index.rst').strpath,
+            tmpdir.join('index.rst.edited').strpath])
+
+        status, seconds = build_server.build()
+        assert status == 0
+
+        assert not build_server.check_changes()
+
+    finally:
+        for name in list(sys.modules):
+            if name.split('.')[0] == 'serverpkg':
+                del sys.modules[name]
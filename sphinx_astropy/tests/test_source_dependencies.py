@@ -0,0 +1,100 @@
+from .test_conf import build_main, generate_files
+
+SOURCE_DEPENDENCIES_CONF = """
+import sys
+sys.path.insert(0, {0!r})
+extensions = extensions + ['sphinx_astropy.ext.source_dependencies']
+"""
+
+SOURCE_DEPENDENCIES_INDEX = """
+Title
+=====
+
+.. toctree::
+
+   api
+   other
+"""
+
+API_PAGE = """
+API
+===
+
+.. automodule:: source_dependencies_module
+   :members:
+"""
+
+OTHER_PAGE = """
+Other
+=====
+
+Just text
+"""
+
+MODULE = '''
+def add(a, b):
+    """
+    Add two numbers.
+    """
+    return a + b
+'''
+
+
+def test_source_dependencies(tmpdir, capsys):
+
+    generate_files(tmpdir)
+
+    package_dir = tmpdir.mkdir('package')
+    module = package_dir.join('source_dependencies_module.py')
+    module.write(MODULE)
+
+    with open(tmpdir.join('conf.py').strpath, 'a') as f:
+        f.write(SOURCE_DEPENDENCIES_CONF.format(package_dir.strpath))
+
+    tmpdir.join('index.rst').write(SOURCE_DEPENDENCIES_INDEX)
+    tmpdir.join('api.rst').write(API_PAGE)
+    tmpdir.join('other.rst').write(OTHER_PAGE)
+
+    src_dir = tmpdir.strpath
+    html_dir = tmpdir.mkdir('html').strpath
+
+    argv = ['-W', '-b', 'html', src_dir, html_dir, '-D', 'disable_intersphinx=1']
+
+    status = build_main(argv=argv)
+    assert status == 0
+
+    capsys.readouterr()
+
+    # Touching the module without changing it should not trigger a rebuild
+    module.setmtime(module.mtime() + 10)
+
+    status = build_main(argv=argv)
+    assert status == 0
+
+    captured = capsys.readouterr()
+    assert '[source_dependencies]' not in captured.out
+
+    # Changing the module should only rebuild the page that documents it
+    module.write(MODULE + '\n\nMULTIPLIER = 2\n')
+
+    status = build_main(argv=argv)
+    assert status == 0
+
+    captured = capsys.readouterr()
+    assert ('rebuilding api because {0} changed'.format(module.strpath)
+            in captured.out)
+    assert 'rebuilding other' not in captured.out
+    assert 'rebuilding index' not in captured.out
+
+    # Changes that don't update the modification time (which Sphinx would
+    # otherwise miss) should also be picked up
+    mtime = module.mtime()
+    module.write(MODULE + '\n\nMULTIPLIER = 3\n')
+    module.setmtime(mtime - 100)
+
+    status = build_main(argv=argv)
+    assert status == 0
+
+    captured = capsys.readouterr()
+    assert 'rebuilding api because' in captured.out
+    assert '1 changed' in captured.out